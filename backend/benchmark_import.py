@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import tempfile
+from datetime import date, timedelta
+import pandas as pd
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import our custom modules
+from backend.database import Base, init_search_index
+from backend.models import Patient, PatientResponse
+from backend.services import PatientService
+
+ROW_COUNT = 100_000
+# Every Nth generated row has no joining_date and must be rejected as invalid
+MISSING_JOINING_DATE_EVERY = 1000
+
+def make_patients(row_count):
+    """Generate synthetic historical patient records"""
+    start = date(2015, 1, 1)
+    return pd.DataFrame({
+        'patient_name': [f"Patient {i}" for i in range(row_count)],
+        'joining_date': [
+            None if i % MISSING_JOINING_DATE_EVERY == 0 else start + timedelta(days=i % 3650)
+            for i in range(row_count)
+        ],
+        'symptoms': ["fever, cough and fatigue for three days"] * row_count,
+        'latest_diagnosis': ["Likely viral upper respiratory tract infection"] * row_count,
+        'medicine_suggestions': ["Paracetamol 500 mg every 6 hours as needed"] * row_count,
+    })
+
+def run(file_format, path):
+    """Import the file into a fresh SQLite database and report throughput"""
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        init_search_index(engine)
+        db = sessionmaker(bind=engine)()
+        try:
+            started = time.perf_counter()
+            summary = PatientService().bulk_import_patients(db, path, file_format)
+            elapsed = time.perf_counter() - started
+            stored = db.execute(select(func.count()).select_from(Patient)).scalar()
+
+            # Every imported row must be readable through the API response model
+            expected_invalid = len(range(0, ROW_COUNT, MISSING_JOINING_DATE_EVERY))
+            assert summary['invalid'] == expected_invalid, summary
+            for patient in db.execute(select(Patient)).scalars():
+                PatientResponse.model_validate(patient)
+
+            started = time.perf_counter()
+            exported = sum(len(part) for part in PatientService().export_patients(db, file_format))
+            export_elapsed = time.perf_counter() - started
+        finally:
+            db.close()
+            engine.dispose()
+
+    print(f"{file_format:8} import: {summary['imported']} rows in {elapsed:.2f}s "
+          f"({summary['imported'] / elapsed:,.0f} rows/s), {stored} stored, "
+          f"{summary['invalid']} invalid, all readable")
+    print(f"{file_format:8} export: {exported / 1e6:.1f} MB in {export_elapsed:.2f}s")
+
+if __name__ == "__main__":
+    patients = make_patients(ROW_COUNT)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "patients.csv")
+        parquet_path = os.path.join(tmp, "patients.parquet")
+        patients.to_csv(csv_path, index=False)
+        patients.to_parquet(parquet_path, index=False)
+
+        run('csv', csv_path)
+        run('parquet', parquet_path)
@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import random
+import tempfile
+import statistics
+from datetime import date, timedelta
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import our custom modules
+from backend.database import Base, init_search_index
+from backend.services import PatientService
+
+ROW_COUNT = 300_000
+REPEATS = 50
+
+SYMPTOMS = [
+    "chest pain", "fever", "dry cough", "headache", "nausea", "fatigue", "shortness of breath",
+    "skin rash", "lower back pain", "dizziness", "palpitations", "joint swelling", "sore throat",
+    "abdominal pain", "night sweats", "blurred vision", "weight loss", "wheezing", "insomnia",
+    "muscle cramps", "numbness in hands", "frequent urination", "ankle oedema", "heartburn"
+]
+DIAGNOSES = [
+    "stable angina", "unstable angina", "influenza", "migraine", "gastroenteritis", "asthma",
+    "community acquired pneumonia", "essential hypertension", "contact dermatitis",
+    "osteoarthritis", "iron deficiency anemia", "GERD", "acute bronchitis", "type 2 diabetes",
+    "hypothyroidism", "carpal tunnel syndrome", "heart failure", "tension headache"
+]
+MEDICINES = [
+    "aspirin 81 mg daily", "paracetamol 500 mg as needed", "ibuprofen 400 mg three times daily",
+    "omeprazole 20 mg daily", "salbutamol inhaler as needed", "metformin 500 mg twice daily",
+    "levothyroxine 50 mcg daily", "furosemide 40 mg daily", "amlodipine 5 mg daily"
+]
+
+# (label, search_patients keyword arguments)
+QUERIES = [
+    ("q=chest pain", dict(query="chest pain")),
+    ("symptoms=chest pain&diagnosis=angina", dict(symptoms="chest pain", diagnosis="angina")),
+    ("diagnosis=unstable angina", dict(diagnosis="unstable angina")),
+    ("q=omeprazole", dict(query="omeprazole")),
+    ("q=night sweats weight loss", dict(query="night sweats weight loss")),
+    ("q=carpal tunnel numbness", dict(query="carpal tunnel numbness")),
+    ("q=chest pain, page 50", dict(query="chest pain", page=50)),
+    ("q=chest pain, page 101 (past ranked)", dict(query="chest pain", page=101)),
+    ("q=chest pain, page 1200", dict(query="chest pain", page=1200)),
+    ("q=xylophone (no match)", dict(query="xylophone")),
+]
+
+def make_patients(row_count):
+    """Generate synthetic patients with varied free-text fields"""
+    rng = random.Random(42)
+    start = date(2015, 1, 1)
+    return pd.DataFrame({
+        'patient_name': [f"Patient {i}" for i in range(row_count)],
+        'joining_date': [start + timedelta(days=i % 3650) for i in range(row_count)],
+        'symptoms': [", ".join(rng.sample(SYMPTOMS, rng.randint(1, 3))) for _ in range(row_count)],
+        'latest_diagnosis': [
+            f"Likely {rng.choice(DIAGNOSES)}; consider {rng.choice(DIAGNOSES)}" for _ in range(row_count)
+        ],
+        'medicine_suggestions': [rng.choice(MEDICINES) for _ in range(row_count)],
+    })
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        parquet_path = os.path.join(tmp, "patients.parquet")
+        make_patients(ROW_COUNT).to_parquet(parquet_path, index=False)
+
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        init_search_index(engine)
+        db = sessionmaker(bind=engine)()
+        service = PatientService()
+        try:
+            service.bulk_import_patients(db, parquet_path, 'parquet')
+
+            # Paging must reach every match exactly once, past the ranked candidates too
+            total, _, _ = service.search_patients(db, query="carpal tunnel numbness")
+            seen = []
+            page = 1
+            while True:
+                _, _, results = service.search_patients(db, query="carpal tunnel numbness", page=page, page_size=100)
+                if not results:
+                    break
+                seen += [result['patient_id'] for result in results]
+                page += 1
+            assert len(seen) == len(set(seen)) == total, (len(seen), len(set(seen)), total)
+
+            print(f"Searching {ROW_COUNT} patients, {REPEATS} runs per query")
+            for label, kwargs in QUERIES:
+                service.search_patients(db, **kwargs)
+                timings = []
+                for _ in range(REPEATS):
+                    started = time.perf_counter()
+                    total, candidates, results = service.search_patients(db, **kwargs)
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                print(f"{label:40} {total:7} matches {candidates:5} ranked {len(results):3} returned  "
+                      f"median {statistics.median(timings):6.1f} ms  p95 {p95:6.1f} ms")
+        finally:
+            db.close()
+            engine.dispose()
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -21,4 +21,28 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Free-text patient columns covered by the patients_fts full-text index
+SEARCH_INDEX_COLUMNS = ['symptoms', 'new_symptoms', 'latest_diagnosis', 'medicine_suggestions']
+
+def init_search_index(bind=engine, rebuild=False):
+    """Create the SQLite FTS5 index over patients and rebuild it when needed
+
+    PatientService keeps the index in sync on every write. Comparing row counts only
+    catches rows that were added or removed without it (e.g. a database created before
+    the index existed); rows edited in place by other writers or direct SQL leave the
+    count unchanged, so pass rebuild=True to re-index every row from patients.
+    """
+    columns = ", ".join(SEARCH_INDEX_COLUMNS)
+    with bind.begin() as conn:
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5({columns}, tokenize='porter unicode61')"
+        ))
+        indexed = conn.execute(text("SELECT count(*) FROM patients_fts")).scalar()
+        stored = conn.execute(text("SELECT count(*) FROM patients")).scalar()
+        if rebuild or indexed != stored:
+            conn.execute(text("DELETE FROM patients_fts"))
+            conn.execute(text(
+                f"INSERT INTO patients_fts(rowid, {columns}) SELECT patient_id, {columns} FROM patients"
+            ))
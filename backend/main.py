@@ -1,23 +1,27 @@
-from fastapi import FastAPI, HTTPException, Depends, status, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, Depends, status, File, UploadFile, Form, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import os
 import sys
 import shutil
 from typing import Optional
 import time
+import asyncio
 import aiofiles
 
 # Add the parent directory to the path so we can import our modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import our custom modules
-from backend.database import get_db, engine
-from backend.models import PatientCreate, PatientResponse, PatientUpdate, DiagnosisResponse, Base, ReturningPatientRequest
+from backend.database import get_db, engine, SessionLocal, init_search_index
+from backend.models import PatientCreate, PatientResponse, PatientUpdate, DiagnosisResponse, Base, ReturningPatientRequest, PatientImportResponse, PatientSearchResponse
 import json # Added for parsing AI response
-from backend.services import PatientService, AIService
+from backend.services import PatientService, AIService, BULK_FILE_FORMATS
 
 Base.metadata.create_all(bind=engine)
+# Set REBUILD_SEARCH_INDEX=1 after editing patients outside PatientService
+init_search_index(engine, rebuild=os.getenv('REBUILD_SEARCH_INDEX') == '1')
 
 app = FastAPI(
     title="Health Monitoring API",
@@ -38,6 +42,15 @@ app.add_middleware(
 patient_service = PatientService()
 ai_service = AIService()
 
+# Per-endpoint deadlines (in seconds) for the Gemini diagnosis call
+NEW_DIAGNOSIS_TIMEOUT = float(os.getenv('NEW_DIAGNOSIS_TIMEOUT', '60'))
+RETURNING_DIAGNOSIS_TIMEOUT = float(os.getenv('RETURNING_DIAGNOSIS_TIMEOUT', '60'))
+# How often to check whether the client has gone away during a diagnosis
+DISCONNECT_POLL_INTERVAL = 0.5
+
+# Non-standard status (as used by nginx) for requests abandoned by the client
+CLIENT_CLOSED_REQUEST = 499
+
 # Helper function to save uploaded file
 async def save_upload_file(upload_file: UploadFile) -> str:
     """Save an uploaded file and return the file path"""
@@ -63,12 +76,55 @@ async def save_upload_file(upload_file: UploadFile) -> str:
         print(f"Error saving file: {e}")
         return None
 
+async def wait_for_disconnect(request: Request):
+    """Return once the client has closed the connection"""
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+async def get_diagnosis_or_abort(request: Request, timeout: float, symptoms: str, prev_diagnosis: Optional[str] = None, image_url: Optional[str] = None) -> str:
+    """Run the AI diagnosis, cancelling it if the client disconnects or the deadline passes
+
+    Nothing is written to the database here, and every failure (disconnect, deadline
+    or upstream error) raises, so the patient record is left as it was before the
+    call and a retry can pick up from there.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    diagnosis_task = asyncio.create_task(
+        ai_service.get_diagnosis_async(symptoms, prev_diagnosis, image_url, timeout=timeout)
+    )
+    disconnect_task = asyncio.create_task(wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait(
+            {diagnosis_task, disconnect_task},
+            timeout=timeout,
+            return_when=asyncio.FIRST_COMPLETED
+        )
+    finally:
+        for task in (diagnosis_task, disconnect_task):
+            if not task.done():
+                task.cancel()
+
+    if diagnosis_task in done:
+        try:
+            return diagnosis_task.result()
+        except Exception as e:
+            print(f"Error in diagnosis generation: {e}")
+            if loop.time() >= deadline:
+                raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Diagnosis timed out, please retry")
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Diagnosis service unavailable, please retry")
+    if disconnect_task in done:
+        print("Client disconnected, cancelled diagnosis")
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+    raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Diagnosis timed out, please retry")
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Health Monitoring API"}
 
 @app.post("/api/diagnosis/new", response_model=PatientResponse, status_code=status.HTTP_201_CREATED)
 async def create_new_patient(
+    request: Request,
     patient_name: str = Form(...),
     symptoms: str = Form(...),
     image: Optional[UploadFile] = File(None),
@@ -98,7 +154,7 @@ async def create_new_patient(
         
         # Get diagnosis if symptoms are provided
         if symptoms:
-            ai_response_str = ai_service.get_diagnosis(symptoms, None, image_url)
+            ai_response_str = await get_diagnosis_or_abort(request, NEW_DIAGNOSIS_TIMEOUT, symptoms, None, image_url)
             diagnosis = "Could not retrieve diagnosis."
             medicine_suggestions = "Could not retrieve medicine suggestions."
 
@@ -127,11 +183,14 @@ async def create_new_patient(
             db_patient.medicine_suggestions = medicine_suggestions
         
         return db_patient
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/diagnosis/returning", response_model=PatientResponse)
 async def handle_returning_patient(
+    request: Request,
     patient_id: int = Form(...),
     symptoms: str = Form(...),
     image: Optional[UploadFile] = File(None),
@@ -154,7 +213,7 @@ async def handle_returning_patient(
         raise HTTPException(status_code=400, detail="Failed to update patient")
     
     # Get new diagnosis based on old diagnosis and new symptoms
-    ai_response_str = ai_service.get_diagnosis(symptoms, updated_patient.prev_diagnosis, image_url)
+    ai_response_str = await get_diagnosis_or_abort(request, RETURNING_DIAGNOSIS_TIMEOUT, symptoms, updated_patient.prev_diagnosis, image_url)
     diagnosis = "Could not retrieve diagnosis."
     medicine_suggestions = "Could not retrieve medicine suggestions."
 
@@ -184,6 +243,74 @@ async def handle_returning_patient(
     
     return updated_patient
 
+@app.post("/api/patients/import", response_model=PatientImportResponse)
+def import_patients(
+    file: UploadFile = File(...),
+    file_format: Optional[str] = Form(None),
+    db: Session = Depends(get_db)
+):
+    """Bulk import patients from a CSV or Parquet file
+
+    The format is taken from file_format if given, otherwise from the file extension.
+    Patients whose name already exists are skipped rather than treated as returning.
+    joining_date is required and dates must be YYYY-MM-DD; other rows are skipped and counted as invalid.
+    """
+    file_format = (file_format or os.path.splitext(file.filename or "")[1].lstrip(".")).lower()
+    if file_format not in BULK_FILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported file format, expected one of {', '.join(BULK_FILE_FORMATS)}")
+
+    try:
+        summary = patient_service.bulk_import_patients(db, file.file, file_format)
+    except (ValueError, OSError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read file: {e}")
+    if summary is None:
+        raise HTTPException(status_code=400, detail="Failed to import patients")
+    return summary
+
+@app.get("/api/patients/export")
+def export_patients(file_format: str = "csv"):
+    """Stream all patients as CSV or Parquet"""
+    file_format = file_format.lower()
+    if file_format not in BULK_FILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported file format, expected one of {', '.join(BULK_FILE_FORMATS)}")
+
+    def stream():
+        # The response outlives the request dependencies, so the stream owns its session
+        db = SessionLocal()
+        try:
+            yield from patient_service.export_patients(db, file_format)
+        finally:
+            db.close()
+
+    media_type = "text/csv" if file_format == "csv" else "application/vnd.apache.parquet"
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="patients.{file_format}"'}
+    )
+
+@app.get("/api/patients/search", response_model=PatientSearchResponse)
+def search_patients(
+    q: Optional[str] = None,
+    symptoms: Optional[str] = None,
+    diagnosis: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Search patients by symptoms, diagnoses and medicine suggestions
+
+    q matches any indexed field, while symptoms and diagnosis restrict matching to
+    those fields, e.g. symptoms=chest pain&diagnosis=angina. All given words must match.
+    The newest ranked_candidates matches come first, ordered by relevance; any older
+    matches follow on later pages newest first, with a null score.
+    """
+    if not any(terms and terms.strip() for terms in (q, symptoms, diagnosis)):
+        raise HTTPException(status_code=400, detail="Provide at least one of q, symptoms or diagnosis")
+
+    total, candidates, results = patient_service.search_patients(db, q, symptoms, diagnosis, page, page_size)
+    return {"total": total, "ranked_candidates": candidates, "page": page, "page_size": page_size, "results": results}
+
 # Keeping only the get patient endpoint for internal use
 @app.get("/api/patients/{patient_id}", response_model=PatientResponse)
 async def get_patient(patient_id: int, db: Session = Depends(get_db)):
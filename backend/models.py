@@ -61,4 +61,26 @@ class PatientResponse(PatientBase):
 
 class DiagnosisResponse(BaseModel):
     """Pydantic model for diagnosis response"""
-    text: str
\ No newline at end of file
+    text: str
+
+class PatientImportResponse(BaseModel):
+    """Pydantic model for bulk patient import summary"""
+    imported: int
+    duplicates: int
+    invalid: int
+
+class PatientSearchResult(BaseModel):
+    """Pydantic model for a single full-text search hit"""
+    patient_id: int
+    patient_name: str
+    latest_diagnosis: Optional[str] = None
+    snippet: str
+    score: Optional[float] = None  # bm25 relevance, None for matches past the ranked candidates
+
+class PatientSearchResponse(BaseModel):
+    """Pydantic model for a page of full-text search results"""
+    total: int
+    ranked_candidates: int  # Newest matches, returned first by relevance; older ones follow newest first
+    page: int
+    page_size: int
+    results: List[PatientSearchResult]
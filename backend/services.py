@@ -1,21 +1,166 @@
 import os
+import re
 import sys
-from datetime import datetime
+import asyncio
+from datetime import datetime, date
+from sqlalchemy import insert, select, text
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
+import pandas as pd
 from google import genai
+from google.genai import types
 import PIL.Image
 from base64 import b64encode
 from io import BytesIO
-from typing import Optional
+from typing import Optional, Iterator, List
 
 # Add the parent directory to the path so we can import our modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import our custom modules
 from backend.models import Patient
+from backend.database import SEARCH_INDEX_COLUMNS
 from backend.ai_service import AIService
 
+# Columns accepted by bulk import and written by export (patient_id is assigned by the database)
+PATIENT_IMPORT_COLUMNS = [
+    'patient_name', 'joining_date', 'discharge_date', 'symptoms', 'prev_diagnosis',
+    'new_symptoms', 'latest_diagnosis', 'medicine_suggestions', 'image_url'
+]
+PATIENT_EXPORT_COLUMNS = ['patient_id'] + PATIENT_IMPORT_COLUMNS
+PATIENT_DATE_COLUMNS = ['joining_date', 'discharge_date']
+# Imported dates must be ISO formatted; anything else is rejected rather than guessed
+IMPORT_DATE_FORMAT = '%Y-%m-%d'
+BULK_FILE_FORMATS = ('csv', 'parquet')
+# bm25 cost grows with the number of matches, so search ranks the newest this many by
+# relevance and pages through any older matches newest first after them
+SEARCH_CANDIDATE_LIMIT = 2000
+
+def _iter_import_chunks(source, file_format: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Read a CSV or Parquet file (path or file object) as DataFrames of at most chunk_size rows"""
+    if file_format == 'csv':
+        yield from pd.read_csv(
+            source,
+            chunksize=chunk_size,
+            dtype=str,
+            usecols=lambda column: column in PATIENT_IMPORT_COLUMNS
+        )
+    elif file_format == 'parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(source)
+        columns = [c for c in parquet_file.schema_arrow.names if c in PATIENT_IMPORT_COLUMNS]
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported file format: {file_format}")
+
+def _parse_import_dates(values: pd.Series) -> pd.Series:
+    """Parse a date column as ISO dates, leaving NaT for missing or unparseable values"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.date
+    # Parquet date columns arrive as date objects, CSV ones as strings
+    as_text = values.map(lambda value: value.isoformat()[:10] if isinstance(value, date) else value)
+    return pd.to_datetime(as_text, format=IMPORT_DATE_FORMAT, errors='coerce').dt.date
+
+def _prepare_import_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Normalise an import chunk to the patients table columns, with None for missing values
+
+    Rows without a patient_name or joining_date, or with a date that is present but not
+    a valid ISO date, are dropped so the caller can count them as invalid. A missing
+    discharge_date stays NULL.
+    """
+    chunk = chunk.reindex(columns=PATIENT_IMPORT_COLUMNS)
+    chunk = chunk[chunk['patient_name'].notna()]
+    chunk['patient_name'] = chunk['patient_name'].astype(str).str.strip()
+    chunk = chunk[chunk['patient_name'] != '']
+
+    valid = pd.Series(True, index=chunk.index)
+    for column in PATIENT_DATE_COLUMNS:
+        raw = chunk[column].map(lambda value: (value.strip() or None) if isinstance(value, str) else value)
+        parsed = _parse_import_dates(raw)
+        valid &= raw.isna() | parsed.notna()
+        chunk[column] = parsed
+    # joining_date is required when reading patients back, and must not be invented
+    valid &= chunk['joining_date'].notna()
+    chunk = chunk[valid]
+    return chunk.astype(object).where(chunk.notna(), None)
+
+def _index_patient(db: Session, patient: Patient):
+    """Replace a patient's entry in the full-text index within the current transaction"""
+    columns = ", ".join(SEARCH_INDEX_COLUMNS)
+    values = ", ".join(f":{column}" for column in SEARCH_INDEX_COLUMNS)
+    db.execute(text("DELETE FROM patients_fts WHERE rowid = :patient_id"), {'patient_id': patient.patient_id})
+    db.execute(
+        text(f"INSERT INTO patients_fts(rowid, {columns}) VALUES (:patient_id, {values})"),
+        {'patient_id': patient.patient_id, **{column: getattr(patient, column) for column in SEARCH_INDEX_COLUMNS}}
+    )
+
+def _index_new_patients(db: Session):
+    """Index every patient newer than the newest indexed one, e.g. after a bulk insert"""
+    columns = ", ".join(SEARCH_INDEX_COLUMNS)
+    db.execute(text(
+        f"INSERT INTO patients_fts(rowid, {columns}) SELECT patient_id, {columns} FROM patients "
+        f"WHERE patient_id > (SELECT coalesce(max(rowid), 0) FROM patients_fts)"
+    ))
+
+def _build_match_query(terms: Optional[str], columns: Optional[List[str]] = None) -> Optional[str]:
+    """Turn free text into an FTS5 query that matches all words, ignoring FTS5 syntax characters"""
+    words = re.findall(r"\w+", terms or "")
+    if not words:
+        return None
+    query = " ".join(f'"{word}"' for word in words)
+    if columns:
+        return f"{{{' '.join(columns)}}} : ({query})"
+    return query
+
+def _fetch_search_hits(db: Session, match: str, condition: str, score: str, order: str, params: dict):
+    """Fetch one slice of search hits with patient details and a highlighted snippet
+
+    Ordering and paging happen inside the FTS query so snippets are only built for the
+    returned rows. CROSS JOIN keeps SQLite from reordering the join and re-running it.
+    """
+    rows = db.execute(
+        text(
+            "SELECT p.patient_id, p.patient_name, p.latest_diagnosis, hits.snippet, hits.score "
+            "FROM (SELECT rowid AS hit_id, snippet(patients_fts, -1, '**', '**', '...', 16) AS snippet, "
+            f"{score} AS score FROM patients_fts "
+            f"WHERE patients_fts MATCH :match AND {condition} "
+            f"ORDER BY {order} LIMIT :limit OFFSET :offset) AS hits "
+            "CROSS JOIN patients p ON p.patient_id = hits.hit_id "
+            f"ORDER BY {order}"
+        ),
+        {'match': match, **params}
+    ).mappings().all()
+    return [dict(row) for row in rows]
+
+class _ParquetStreamSink:
+    """Write-only file object that lets a ParquetWriter be drained between row groups"""
+
+    def __init__(self):
+        self.closed = False
+        self._buffer = BytesIO()
+        self._position = 0
+
+    def write(self, data):
+        self._buffer.write(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        """Return everything written since the last drain"""
+        data = self._buffer.getvalue()
+        self._buffer = BytesIO()
+        return data
+
 class PatientService:
     """Service for patient-related operations"""
     
@@ -40,6 +185,8 @@ class PatientService:
             )
             
             db.add(new_patient)
+            db.flush()
+            _index_patient(db, new_patient)
             db.commit()
             db.refresh(new_patient)
             return new_patient
@@ -57,6 +204,7 @@ class PatientService:
             patient.latest_diagnosis = None  # Reset latest diagnosis
             if image_url:
                 patient.image_url = image_url
+            _index_patient(db, patient)
             db.commit()
             db.refresh(patient)
             return patient
@@ -80,6 +228,7 @@ class PatientService:
                 patient.new_symptoms = new_symptoms
                 if image_url:
                     patient.image_url = image_url
+                _index_patient(db, patient)
                 db.commit()
                 db.refresh(patient)
                 return True
@@ -105,6 +254,7 @@ class PatientService:
                 patient.latest_diagnosis = diagnosis_text
                 if medicine_suggestions_text:
                     patient.medicine_suggestions = medicine_suggestions_text
+                _index_patient(db, patient)
                 db.commit()
                 db.refresh(patient)
                 return True
@@ -122,6 +272,147 @@ class PatientService:
             print(f"Database error: {e}")
             return []
 
+    def search_patients(self, db: Session, query: Optional[str] = None, symptoms: Optional[str] = None,
+                        diagnosis: Optional[str] = None, page: int = 1, page_size: int = 20):
+        """Full-text search over patient symptoms, diagnoses and medicine suggestions
+
+        Args:
+            query: Words to match in any indexed column
+            symptoms: Words to match in symptoms or new_symptoms only
+            diagnosis: Words to match in latest_diagnosis only
+
+        Returns:
+            A (total, candidates, results) tuple. total counts every match; the newest
+            SEARCH_CANDIDATE_LIMIT of them are the candidates, returned first in bm25
+            relevance order. Later pages continue through the older matches newest first,
+            with score set to None as they are not ranked.
+        """
+        clauses = [clause for clause in (
+            _build_match_query(query),
+            _build_match_query(symptoms, ['symptoms', 'new_symptoms']),
+            _build_match_query(diagnosis, ['latest_diagnosis'])
+        ) if clause]
+        if not clauses:
+            return 0, 0, []
+        match = " AND ".join(f"({clause})" for clause in clauses)
+
+        try:
+            total = db.execute(
+                text("SELECT count(*) FROM patients_fts WHERE patients_fts MATCH :match"),
+                {'match': match}
+            ).scalar()
+            candidates = min(total, SEARCH_CANDIDATE_LIMIT)
+            # Lowest rowid among the newest candidates; walking matches by rowid is cheap
+            cutoff = db.execute(
+                text(
+                    "SELECT rowid FROM patients_fts WHERE patients_fts MATCH :match "
+                    "ORDER BY rowid DESC LIMIT 1 OFFSET :offset"
+                ),
+                {'match': match, 'offset': SEARCH_CANDIDATE_LIMIT - 1}
+            ).scalar() or 0
+
+            offset = (page - 1) * page_size
+            results = []
+            if offset < candidates:
+                results = _fetch_search_hits(
+                    db, match, "rowid >= :cutoff", "-bm25(patients_fts)", "score DESC, hit_id DESC",
+                    {'cutoff': cutoff, 'limit': min(page_size, candidates - offset), 'offset': offset}
+                )
+            remaining = page_size - len(results)
+            if remaining and total > candidates:
+                results += _fetch_search_hits(
+                    db, match, "rowid < :cutoff", "NULL", "hit_id DESC",
+                    {'cutoff': cutoff, 'limit': remaining, 'offset': max(0, offset - candidates)}
+                )
+            return total, candidates, results
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            return 0, 0, []
+
+    def bulk_import_patients(self, db: Session, source, file_format: str = 'csv', chunk_size: int = 5000):
+        """Import patients from a CSV or Parquet file in batched transactions
+
+        Rows whose patient_name already exists (in the database or earlier in the file)
+        are skipped as duplicates. Rows with no patient_name or joining_date, or with a
+        joining_date or discharge_date that is not a YYYY-MM-DD date, are skipped as
+        invalid; a missing discharge_date is stored as NULL. Each chunk is committed on
+        its own, so on a database error earlier chunks stay imported and re-running the
+        same file skips them.
+
+        Returns:
+            A dict with the imported, duplicate and invalid row counts, or None on database error
+        """
+        summary = {'imported': 0, 'duplicates': 0, 'invalid': 0}
+        try:
+            # Duplicate detection happens in memory against the names already stored
+            seen_names = set(db.execute(select(Patient.patient_name)).scalars())
+
+            for chunk in _iter_import_chunks(source, file_format, chunk_size):
+                rows = _prepare_import_chunk(chunk)
+                summary['invalid'] += len(chunk) - len(rows)
+
+                is_new = ~rows['patient_name'].isin(seen_names) & ~rows['patient_name'].duplicated()
+                summary['duplicates'] += int((~is_new).sum())
+                rows = rows[is_new]
+                if rows.empty:
+                    continue
+
+                db.execute(insert(Patient), rows.to_dict('records'))
+                _index_new_patients(db)
+                db.commit()
+                seen_names.update(rows['patient_name'])
+                summary['imported'] += len(rows)
+            return summary
+        except SQLAlchemyError as e:
+            print(f"Database error: {e}")
+            db.rollback()
+            return None
+
+    def export_patients(self, db: Session, file_format: str = 'csv', chunk_size: int = 5000) -> Iterator[bytes]:
+        """Stream the patients table as CSV or Parquet, holding at most chunk_size rows in memory"""
+        if file_format not in BULK_FILE_FORMATS:
+            raise ValueError(f"Unsupported file format: {file_format}")
+
+        columns = [getattr(Patient, column) for column in PATIENT_EXPORT_COLUMNS]
+        if file_format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            schema = pa.schema([
+                (column, pa.int64() if column == 'patient_id'
+                 else pa.date32() if column in PATIENT_DATE_COLUMNS
+                 else pa.string())
+                for column in PATIENT_EXPORT_COLUMNS
+            ])
+            sink = _ParquetStreamSink()
+            writer = pq.ParquetWriter(sink, schema)
+
+        last_id = 0
+        first_chunk = True
+        while True:
+            # Keyset pagination keeps each query cheap regardless of table size
+            rows = db.execute(
+                select(*columns)
+                .where(Patient.patient_id > last_id)
+                .order_by(Patient.patient_id)
+                .limit(chunk_size)
+            ).all()
+
+            chunk = pd.DataFrame.from_records(rows, columns=PATIENT_EXPORT_COLUMNS)
+            if file_format == 'csv':
+                yield chunk.to_csv(index=False, header=first_chunk).encode('utf-8')
+            elif rows:
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                yield sink.drain()
+
+            if len(rows) < chunk_size:
+                break
+            last_id = rows[-1].patient_id
+            first_chunk = False
+
+        if file_format == 'parquet':
+            writer.close()
+            yield sink.drain()
+
 class AIService:
     """Service for AI-related operations"""
     
@@ -154,40 +445,51 @@ class AIService:
             print(f"Error preparing image: {e}")
             return None
 
-    def get_diagnosis(self, symptoms, prev_diagnosis=None, image_path=None):
-        try:
-            # Prepare the prompt
-            prompt = f"""You are a knowledgeable medical assistant. Analyze the following symptoms: {symptoms}. Provide a diagnosis and suggest potential medicines. Respond in a direct and professional tone, without any disclaimers about not being a real doctor. Structure your response clearly, perhaps with 'Diagnosis:' and 'Medicine Suggestions:' sections."""
-            if prev_diagnosis:
-                prompt += f"\nPrevious diagnosis: {prev_diagnosis}"
-            
-            # Prepare contents list for generate_content
-            contents = [prompt]
-            
-            # Add image if provided
-            if image_path:
-                image = self._prepare_image(image_path)
-                if image:
-                    contents.append(image)
-            
-            # Generate response using the client
-            # print(contents)
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=contents
+    def _build_diagnosis_contents(self, symptoms, prev_diagnosis=None, image_path=None):
+        """Build the contents list sent to Gemini for a diagnosis request"""
+        # Prepare the prompt
+        prompt = f"""You are a knowledgeable medical assistant. Analyze the following symptoms: {symptoms}. Provide a diagnosis and suggest potential medicines. Respond in a direct and professional tone, without any disclaimers about not being a real doctor. Structure your response clearly, perhaps with 'Diagnosis:' and 'Medicine Suggestions:' sections."""
+        if prev_diagnosis:
+            prompt += f"\nPrevious diagnosis: {prev_diagnosis}"
+        
+        # Prepare contents list for generate_content
+        contents = [prompt]
+        
+        # Add image if provided
+        if image_path:
+            image = self._prepare_image(image_path)
+            if image:
+                contents.append(image)
+        return contents
+
+    async def get_diagnosis_async(self, symptoms, prev_diagnosis=None, image_path=None, timeout: Optional[float] = None):
+        """Get a diagnosis without blocking the event loop, so the call can be cancelled
+
+        Args:
+            symptoms: Current symptoms reported by the patient
+            prev_diagnosis: Optional previous diagnosis to consider for continuity of care
+            image_path: Optional path to a medical image for analysis
+            timeout: Optional deadline in seconds, passed on to the upstream HTTP request
+
+        Errors are raised rather than replaced with a placeholder so the caller can tell
+        a timeout, cancellation or upstream failure apart from a real answer.
+        """
+        # Image decoding and resizing is CPU bound, so keep it off the event loop
+        contents = await asyncio.to_thread(self._build_diagnosis_contents, symptoms, prev_diagnosis, image_path)
+
+        config = None
+        if timeout is not None:
+            # HttpOptions.timeout is expressed in milliseconds
+            config = types.GenerateContentConfig(
+                http_options=types.HttpOptions(timeout=int(timeout * 1000))
             )
-            # print(response)
-            # Assuming the response.text contains both diagnosis and medicine suggestions
-            # We'll need to parse this. For now, let's assume a simple split or a structured response from AI.
-            # For this example, let's assume the AI will return a JSON string like: {"diagnosis": "...", "medicine_suggestions": "..."}
-            # This part will heavily depend on how you instruct the Gemini API and how it formats its response.
-            # For a more robust solution, you'd parse a structured JSON response.
-            # For now, we'll just return the raw text and handle parsing/splitting in the main.py or expect a specific format.
-            return response.text # Placeholder: This needs to be updated to return structured data or parse it here.
-            
-        except Exception as e:
-            print(f"Error in diagnosis generation: {e}")
-            return "{\"diagnosis\": \"Unable to generate diagnosis at this time. Please try again later.\", \"medicine_suggestions\": \"No medicine suggestions available.\"}" # Return a JSON string
+
+        response = await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=contents,
+            config=config
+        )
+        return response.text
 
     def get_health_advice(self, condition: str):
         """Get general health advice for a specific condition